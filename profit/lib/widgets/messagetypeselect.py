@@ -5,12 +5,26 @@
 # Distributed under the terms of the GNU General Public License v2
 
 from PyQt4.QtCore import Qt, pyqtSignature
-from PyQt4.QtGui import QFrame, QStandardItem
+from PyQt4.QtGui import QFrame, QListWidgetItem
 
 from ib.opt.message import messageTypeNames
 from profit.lib.widgets.ui_messagetypeselect import Ui_MessageTypeSelect
 
 
+_sortedTypeNames = None
+
+
+def sortedTypeNames():
+    """ Returns the sorted message type names, built on first call.
+
+    @return list of message type names
+    """
+    global _sortedTypeNames
+    if _sortedTypeNames is None:
+        _sortedTypeNames = sorted(messageTypeNames())
+    return _sortedTypeNames
+
+
 class MessageTypeSelect(QFrame, Ui_MessageTypeSelect):
     """ MessageTypeSelect -> widget for selecting various IB message types.
 
@@ -30,10 +44,9 @@ class MessageTypeSelect(QFrame, Ui_MessageTypeSelect):
         """
         typesList = self.typesList
         typesList.clear()
-        self.allTypeNames = typeNames = messageTypeNames()
-        for typeRow, typeName in enumerate(sorted(typeNames)):
-            typesList.addItem(typeName)
-            item = typesList.item(typeRow)
+        self.allTypeNames = typeNames = sortedTypeNames()[:]
+        for typeName in typeNames:
+            item = QListWidgetItem(typeName, typesList)
             item.setCheckState(Qt.Checked)
 
     def listItems(self):
@@ -54,7 +67,7 @@ class MessageTypeSelect(QFrame, Ui_MessageTypeSelect):
 
         """
         if self.allCheck.checkState()==Qt.Checked:
-            return self.allTypeNames
+            return self.allTypeNames[:]
         return [str(i.text()) for i in self.listItems()
                 if i.checkState()==Qt.Checked]
 
@@ -4,3 +4,142 @@
 # Copyright 2007 Troy Melhase
 # Distributed under the terms of the GNU General Public License v2
 # Author: Troy Melhase <troy@gci.net>
+
+from cPickle import PicklingError, UnpicklingError, load as pickleLoad
+
+try:
+    import msgpack
+except (ImportError, ):
+    msgpack = None
+    from cPickle import HIGHEST_PROTOCOL, dump as pickleDump
+
+
+##
+# Exceptions raised for unreadable or unwritable strategy file contents.
+readErrors = (UnpicklingError, EOFError, IOError, )
+writeErrors = (PicklingError, ValueError, TypeError, OverflowError,
+               IOError, )
+if msgpack is not None:
+    readErrors += (msgpack.UnpackException, )
+
+
+##
+# Other exceptions cPickle raises for malformed or foreign pickles.
+# iterStrategy reports these as UnpicklingError.
+pickleLoadErrors = (ImportError, AttributeError, ValueError, KeyError,
+                    IndexError, TypeError, )
+
+
+##
+# Leading bytes of a msgpack-encoded list (fixarray, array16, array32).
+# Strategy files always hold a list at the top level; anything else
+# is treated as a legacy pickle.
+msgpackListMarkers = set(
+    [chr(c) for c in range(0x90, 0xa0)] + ['\xdc', '\xdd'])
+
+
+def packDefault(obj):
+    """ Converts objects msgpack can't serialize into ones it can.
+
+    @param obj object unknown to msgpack
+    @return serializable replacement for obj
+    """
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError('Unable to serialize %r' % (obj, ))
+
+
+def dumpStrategy(schema, handle, count=None):
+    """ Writes strategy schema to an open file.
+
+    The schema is written with msgpack when available, otherwise with
+    the highest (binary) pickle protocol.  With msgpack each item is
+    packed and written as it is taken from the schema, so a generator
+    of items need not be collected into a list first when its length
+    is given as count.
+
+    @param schema strategy schema as sequence or iterable of dictionaries
+    @param handle file object opened for binary writing
+    @param count=None number of items in schema, if it has no length
+    @return None
+    """
+    if msgpack is None:
+        pickleDump(list(schema), handle, HIGHEST_PROTOCOL)
+        return
+    if count is None:
+        schema = list(schema)
+        count = len(schema)
+    packer = msgpack.Packer(use_bin_type=True, default=packDefault)
+    write = handle.write
+    write(packer.pack_array_header(count))
+    for item in schema:
+        write(packer.pack(item))
+
+
+def iterStrategy(handle):
+    """ Yields each item of the strategy schema in an open file.
+
+    With msgpack files, items are unpacked one at a time as they are
+    read.  Files written by older versions are pickles; these are
+    detected by their first byte and read with pickle.  Malformed
+    files raise one of readErrors.
+
+    @param handle file object opened for binary reading
+    @return generator of strategy schema dictionaries
+    """
+    marker = handle.read(1)
+    handle.seek(0)
+    if marker in msgpackListMarkers:
+        if msgpack is None:
+            raise IOError('msgpack is required to read this strategy file')
+        unpacker = msgpack.Unpacker(handle, raw=False)
+        unpack = unpacker.unpack
+        for i in range(unpacker.read_array_header()):
+            try:
+                item = unpack()
+            except (ValueError, ), exc:
+                raise msgpack.UnpackException(str(exc))
+            yield item
+    else:
+        try:
+            schema = pickleLoad(handle)
+        except pickleLoadErrors, exc:
+            raise UnpicklingError('%s: %s' % (exc.__class__.__name__, exc))
+        if not isinstance(schema, list):
+            raise UnpicklingError('strategy file does not hold a list')
+        for item in schema:
+            yield item
+
+
+def loadStrategy(handle):
+    """ Reads strategy schema from an open file.
+
+    @param handle file object opened for binary reading
+    @return strategy schema as list of dictionaries
+    """
+    return list(iterStrategy(handle))
+
+
+def isStrategyItem(data):
+    """ True if data looks like a strategy root item with valid children.
+
+    @param data object read from a strategy file
+    @return True if data is a runner or ticker item mapping and every
+        descendant is an item mapping with a string name and list of
+        children
+    """
+    if not (isinstance(data, dict) and ('execType' in data or
+                                        'tickerId' in data)):
+        return False
+    stack = [data]
+    pop, extend = stack.pop, stack.extend
+    while stack:
+        node = pop()
+        if not isinstance(node, dict):
+            return False
+        children = node.get('children', [])
+        if not (isinstance(children, list) and
+                isinstance(node.get('name', ''), basestring)):
+            return False
+        extend(children)
+    return True
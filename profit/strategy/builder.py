@@ -6,13 +6,13 @@
 # Author: Troy Melhase <troy@gci.net>
 #         Yichun Wei <yichun.wei@gmail.com>
 
-from cPickle import load, loads
 from time import time, strftime
 
 from PyQt4.QtCore import QObject
 
 from profit.lib import BasicHandler, Signals, instance, logging
 from profit.series import Series, KAMA
+from profit.strategy import loadStrategy
 
 from ib.ext.Contract import Contract
 from ib.ext.Order import Order
@@ -103,9 +103,9 @@ class SessionStrategyBuilder(QObject, BasicHandler):
 
     def load(self, source):
         if not hasattr(source, 'read'):
-            source = open(source)
+            source = open(source, 'rb')
         try:
-            instance = load(source)
+            instance = loadStrategy(source)
         except (Exception, ), exc:
             raise Exception('Exception "%s" loading strategy.' % exc)
         for item in instance:
@@ -16,9 +16,20 @@
 ##
 
 
-class Root(object):
+class SchemaNode(object):
+    """ Base class for schema types.
+
+    childTypes holds the types allowed as children; each subclass
+    assigns it at the end of this module, once every type is defined.
+    """
+    childTypes = ()
+
     def allowChildType(self, t):
-        return t in [Runner, Ticker, ]
+        return t in self.childTypes
+
+
+class Root(SchemaNode):
+    pass
 
 
 ##
@@ -27,7 +38,7 @@ class Root(object):
 StrategySchema = Root
 
 
-class Runner(object):
+class Runner(SchemaNode):
     """ Runners describe when to execute the Callables they contain.
 
     The Strategy class turns Runner descriptions into various types of
@@ -36,11 +47,8 @@ class Runner(object):
     """
     attrs = dict(execType='single', periodInterval=1000, messageTypes=set())
 
-    def allowChildType(self, t):
-        return t in [Callable, ]
-
 
-class Ticker(object):
+class Ticker(SchemaNode):
     """ Tickers store the numeric id and symbol of a ticker.  They
     also include contract information.  Tickers can only contain
     fields.
@@ -50,38 +58,34 @@ class Ticker(object):
     attrs = dict(tickerId=None, symbol=None, exchange='',
                  secType='', expiry='', right='', strike=0.0, currency='')
 
-    def allowChildType(self, t):
-        return t in [TickerField, ]
 
-
-class TickerField(object):
+class TickerField(SchemaNode):
     """ TickerField items associate a ticker data field (ask price, bid
     size) with a list of indexes.
 
     """
     attrs = dict(id=-1)
 
-    def allowChildType(self, t):
-        return t in [TickerFieldIndex, ]
-
 
-class TickerFieldIndex(object):
+class TickerFieldIndex(SchemaNode):
     """ TickerFieldIndexs associate an index class (found in profit.series)
     with parameters.
 
     """
     attrs = dict(indexType='', parameters={})
 
-    def allowChildType(self, t):
-        return t in [TickerFieldIndex, ]
 
-
-class Callable(object):
+class Callable(SchemaNode):
     """ Callable items describe where a program or object exists.
 
 
     """
     attrs = dict(callType='', callLocation='', moduleSource='')
 
-    def allowChildType(self, t):
-        return t in [Callable, ]
+
+Root.childTypes = (Runner, Ticker, )
+Runner.childTypes = (Callable, )
+Ticker.childTypes = (TickerField, )
+TickerField.childTypes = (TickerFieldIndex, )
+TickerFieldIndex.childTypes = (TickerFieldIndex, )
+Callable.childTypes = (Callable, )
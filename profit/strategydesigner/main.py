@@ -4,20 +4,22 @@
 # Copyright 2007 Troy Melhase <troy@gci.net>
 # Distributed under the terms of the GNU General Public License v2
 
-from cPickle import dump, load
-from os.path import split
+import gc
+from os.path import getmtime, split
 
 from PyQt4.QtCore import QVariant, Qt, pyqtSignature
 from PyQt4.QtGui import QApplication, QComboBox
 from PyQt4.QtGui import QDoubleSpinBox, QFileDialog, QIcon, QImageReader
 from PyQt4.QtGui import QLabel, QMainWindow, QMessageBox
 from PyQt4.QtGui import QSizePolicy, QSpinBox, QStandardItem
-from PyQt4.QtGui import QStandardItemModel, QToolBar
+from PyQt4.QtGui import QStandardItemModel, QToolBar, QWidget
 
 from profit import series
 from profit.lib import defaults
-from profit.lib import Settings, Signals
+from profit.lib import Settings, Signals, logging
 from profit.lib.widgets.syspathdialog import SysPathDialog
+from profit.strategy import (
+    dumpStrategy, isStrategyItem, iterStrategy, readErrors, writeErrors)
 from profit.strategydesigner.treeitems import (
     CallableItem, TickerItem, FieldItem, IndexItem, RunnerItem)
 from profit.strategydesigner.widgets.ui_strategydesigner import Ui_StrategyDesigner
@@ -25,47 +27,130 @@ from profit.strategydesigner.widgets.ui_strategydesigner import Ui_StrategyDesig
 from ib.ext.TickType import TickType
 
 
+##
+# Buffer size for reading and writing strategy files; large enough
+# that most schemas are transferred with a single system call.
+fileBufferSize = 1 << 20
+
+
+def collectionSuspended(method):
+    """ Decorates method to run with the cyclic garbage collector disabled.
+
+    Building or serializing a large schema allocates many small
+    objects; suspending collection keeps the collector from repeatedly
+    scanning them before the work is done.
+
+    @param method callable to wrap
+    @return wrapped callable
+    """
+    def wrapper(*args, **kwds):
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return method(*args, **kwds)
+        finally:
+            if enabled:
+                gc.enable()
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+def modifiedDeferred(method):
+    """ Decorates method to emit at most one modified signal.
+
+    Modifications reported by the method, and by any handlers it
+    triggers, are collected and signaled once when it returns.
+
+    @param method callable to wrap; first argument is the designer
+    @return wrapped callable
+    """
+    def wrapper(self, *args, **kwds):
+        self.modifiedDepth += 1
+        try:
+            return method(self, *args, **kwds)
+        finally:
+            self.modifiedDepth -= 1
+            if not self.modifiedDepth and self.modifiedPending:
+                self.modifiedPending = False
+                self.emit(Signals.modified)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+def requiresEditItem(method):
+    """ Decorates method to run only when the designer has an edit item.
+
+    The wrapped method receives the edit item as its first argument
+    after the designer.
+
+    @param method callable to wrap
+    @return wrapped callable
+    """
+    def wrapper(self, *args):
+        item = self.editItem
+        if item is not None:
+            return method(self, item, *args)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
 def itemSenderPropMatchMethod(name):
     @pyqtSignature('bool')
     def method(self, checked):
         item = self.editItem
         sender = self.sender()
         if item and sender and checked:
-            setattr(item, name, str(sender.property(name).toString()))
-            self.emit(Signals.modified)
+            value = str(sender.property(name).toString())
+            if getattr(item, name, None) != value:
+                setattr(item, name, value)
+                self.emitModified()
     return method
 
 
 def itemEditedNameMatchMethod():
-    def method(self, text):
-        item = self.editItem
-        if item:
-            item.setText(text)
-            self.emit(Signals.modified)
+    @pyqtSignature('QString')
+    @requiresEditItem
+    def method(self, item, text):
+        item.setText(text)
+        self.emitModified()
     return method
 
 
+_fieldTypes = _indexTypes = None
+
+
 def fieldTypes():
     """ Creates mapping of ticker data fields to field names.
 
+    The mapping is built once and reused by subsequent calls.
+
     @return field to field name mapping
     """
-    items = [(k, getattr(TickType, k)) for k in dir(TickType)]
-    items = [(k, v) for k, v in items if isinstance(v, int)]
-    unknown = TickType.getField(-1)
-    items = [(v, TickType.getField(v)) for k, v in items]
-    return dict([(k, v) for k, v in items if v != unknown])
+    global _fieldTypes
+    if _fieldTypes is None:
+        unknown = TickType.getField(-1)
+        values = [getattr(TickType, k) for k in dir(TickType)]
+        names = [(v, TickType.getField(v))
+                 for v in values if isinstance(v, int)]
+        _fieldTypes = dict((v, n) for v, n in names if n != unknown)
+    return _fieldTypes
 
 
 def indexTypes():
     """ Creates mapping of index class names to index types.
 
+    The mapping is built once and reused by subsequent calls.
+
     @return index class name to index class mapping.
     """
-    def isIndexType(obj):
-        return hasattr(obj, 'params')
-    items = [(k, getattr(series, k)) for k in dir(series)]
-    return dict([(k, v) for k, v in items if isIndexType(v)])
+    global _indexTypes
+    if _indexTypes is None:
+        items = [(k, getattr(series, k)) for k in dir(series)]
+        _indexTypes = dict((k, v) for k, v in items if hasattr(v, 'params'))
+    return _indexTypes
 
 
 class LocalIndexLabel(QLabel):
@@ -83,6 +168,8 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
     defaultText = 'Unknown'
     itemTypePages = {
         TickerItem:1, FieldItem:2, IndexItem:3, CallableItem:4, RunnerItem:5}
+    indexTypeNames = sorted(indexTypes())
+    fieldTypeItems = sorted(fieldTypes().items())
 
     def __init__(self, parent=None, filename=None):
         """ Constructor.
@@ -93,7 +180,13 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         self.setupUi(self)
         self.editItem = None
         self.clipItem = None
-        self.savedStrategy = None
+        self.indexLineNames = []
+        self.imageFilter = None
+        self.strategyKey = None
+        self.modifiedDepth = 0
+        self.schemaCache = None
+        self.modifiedPending = False
+        self.nextTickerId = 1
         self.strategyFile = None
         self.setupWidgets()
         self.readSettings()
@@ -117,6 +210,8 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         parent = self.indexParamGroup
         layout = parent.layout().children()[0]
         parent.setVisible(bool(cls.params))
+        self.indexLineNames = [c.text() for c in item.root().children(True)
+                               if c.text() != self.defaultText]
         for row, (name, props) in enumerate(cls.params):
             label = LocalIndexLabel(name, parent)
             builder = getattr(
@@ -143,10 +238,18 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         self.setupIndexItemDocWidgets(None)
         group = self.indexParamGroup
         layout = group.layout().children()[0]
+        ## junk is parented so that Qt, not the local name, owns it;
+        ## otherwise it and its children would be destroyed on return
+        ## instead of when the deferred delete runs.
+        junk = QWidget(self)
+        junk.hide()
         child = layout.takeAt(0)
         while child:
-             child.widget().deleteLater()
-             child = layout.takeAt(0)
+            widget = child.widget()
+            if widget is not None:
+                widget.setParent(junk)
+            child = layout.takeAt(0)
+        junk.deleteLater()
         group.setVisible(False)
 
     # parameter editor widget builder methods
@@ -178,7 +281,7 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
             item.parameters[name] = editor.value()
         def onChange(value):
             item.parameters[name] = value
-            self.emit(Signals.modified)
+            self.emitModified()
         editor.onChange = onChange
         return editor
 
@@ -219,12 +322,10 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         @param parent ancestor of new widget
         @return QComboBox widget
         """
-        children = list(item.root().children(True))
         editor = QComboBox(parent)
         editor.addItem('')
-        exclude = [item.text(), self.defaultText]
-        items = [c.text() for c in children if c.text() not in exclude]
-        editor.addItems(items)
+        text = item.text()
+        editor.addItems([n for n in self.indexLineNames if n != text])
         try:
             editor.setCurrentIndex(editor.findText(item.parameters[name]))
         except (KeyError, ):
@@ -232,7 +333,7 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         @pyqtSignature('int')
         def onChange(index):
             item.parameters[name] = str(editor.currentText())
-            self.emit(Signals.modified)
+            self.emitModified()
         editor.onChange = onChange
         editor.connect(editor, Signals.currentIndexChanged, onChange)
         return editor
@@ -251,34 +352,61 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
 
     # ordinary methods
 
-    def addStrategyItem(self, data):
-        """ Adds an item at the root
-
-        """
-        try:
-            hasExec = data['execType']
-            return self.addRunnerItem(data)
-        except (KeyError, ):
-            pass
-        try:
-            hasTickerId = data['tickerId']
-            return self.addTickerItem(data)
-        except (KeyError, ):
-            pass
-        raise NotImplemented(str(data))
-
     def addRunnerItem(self, schema):
-        item = RunnerItem.fromSchema(schema)
-        item.setIcon(self.actionInsertRunner.icon())
+        item = self.createRunnerItem(schema)
         self.model.appendRow(item)
         return item
 
     def addTickerItem(self, schema):
-        item = TickerItem.fromSchema(schema)
-        item.loadIcon(self.settings)
+        item = self.createTickerItem(schema)
         self.model.appendRow(item)
         return item
 
+    def createStrategyItem(self, data):
+        """ Creates a root item from schema without adding it to the model.
+
+        @param data schema dictionary for a runner or ticker
+        @return RunnerItem or TickerItem instance
+        """
+        if 'execType' in data:
+            return self.createRunnerItem(data)
+        elif 'tickerId' in data:
+            return self.createTickerItem(data)
+        raise NotImplementedError(str(data))
+
+    @collectionSuspended
+    def createStrategyItems(self, schema):
+        """ Creates root items from schema without adding them to the model.
+
+        @param schema iterable of strategy item dictionaries
+        @return list of RunnerItem and TickerItem instances, or None if
+            schema holds an invalid item
+        """
+        items = []
+        append = items.append
+        create = self.createStrategyItem
+        for data in schema:
+            if not isStrategyItem(data):
+                logging.debug('Invalid strategy item: %r', data)
+                return None
+            append(create(data))
+        return items
+
+    def createRunnerItem(self, schema):
+        item = RunnerItem.fromSchema(schema, self.itemIcons)
+        return item
+
+    def createTickerItem(self, schema):
+        """ Creates a ticker item from schema without adding it to the model.
+
+        @param schema ticker schema dictionary
+        @return TickerItem instance
+        """
+        item = TickerItem.fromSchema(schema, self.itemIcons)
+        item.loadIcon(self.settings)
+        self.nextTickerId = max(self.nextTickerId, (item.tickerId or 0) + 1)
+        return item
+
     def checkClose(self):
         """ Prompts user for next action if schema is modified.
 
@@ -300,11 +428,12 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         return check
 
     def checkModified(self):
-        """ Sets the window modified flag if the schema has changed.
+        """ Sets the window modified flag in response to a schema change.
 
         @return None
         """
-        self.setWindowModified(self.savedStrategy != self.schema)
+        self.schemaCache = None
+        self.setWindowModified(True)
 
     def closeEvent(self, event):
         """ Framework close event handler.  Writes settings and accepts event.
@@ -318,6 +447,17 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         else:
             event.ignore()
 
+    def emitModified(self):
+        """ Emits the modified signal, or notes it while signals are deferred.
+
+        @return None
+        """
+        self.schemaCache = None
+        if self.modifiedDepth:
+            self.modifiedPending = True
+        else:
+            self.emit(Signals.modified)
+
     def enableActions(self, index):
         """ Enables or disables edit and design actions.
 
@@ -374,7 +514,7 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         selectmodel.clear()
         selectmodel.select(newindex, selectmodel.Select)
         self.enableActions(newindex)
-        self.emit(Signals.modified)
+        self.emitModified()
 
     def readSettings(self):
         """ Applies stored setting values to instance.
@@ -404,15 +544,16 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         modified = 0
         if item:
             previous, current = str(previous), str(current)
-            def pred(obj):
-                return obj != item and hasattr(obj, 'parameters')
-            for child in [c for c in item.root().children(True) if pred(c)]:
-                for key, value in child.parameters.items():
-                    if value == previous:
-                        child.parameters[key] = current
+            nodes = [c for c in item.root().children(True)
+                     if c is not item and hasattr(c, 'parameters')]
+            for child in nodes:
+                parameters = child.parameters
+                for key in parameters:
+                    if parameters[key] == previous:
+                        parameters[key] = current
                         modified += 1
         if modified:
-            self.emit(Signals.modified)
+            self.emitModified()
         return modified
 
     def resetStrategy(self):
@@ -421,7 +562,10 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         @return None
         """
         self.model.clear()
+        self.schemaCache = None
+        self.nextTickerId = 1
         self.strategyFile = None
+        self.strategyKey = None
         self.resetWindowTitle()
         self.setWindowModified(False)
         self.controlStack.setCurrentIndex(0)
@@ -440,12 +584,17 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         self.setWindowTitle(title)
 
     def schema(self):
-        """ Constructs and returns ticker schema.
+        """ Constructs and returns ticker schema, cached until modified.
+
+        Callers must not modify the returned list.
 
         @return schema as list of dictionaries.
         """
-        root = self.model.invisibleRootItem()
-        return [root.child(row).toSchema() for row in range(root.rowCount())]
+        if self.schemaCache is None:
+            root = self.model.invisibleRootItem()
+            self.schemaCache = [root.child(row).toSchema()
+                                for row in range(root.rowCount())]
+        return self.schemaCache
 
     def setupRunnerItem(self, item):
         self.runnerName.setText(item.text())
@@ -466,6 +615,7 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
             return item.moduleSource
         def save(src):
             item.moduleSource = editor.sourceText
+            self.schemaCache = None
         editor.basicSetup(
             callType=item.callType,
             locationText=item.callLocation,
@@ -500,7 +650,7 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         @return None
         """
         combo = self.fieldCombo
-        combo.setCurrentIndex(combo.findData(QVariant(item.id)))
+        combo.setCurrentIndex(combo.findData(item.id))
 
     def setupIndexItem(self, item):
         """ Configures index page widgets from given item.
@@ -510,7 +660,7 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         """
         self.indexName.setText(item.text())
         combo = self.indexCombo
-        index = combo.findData(QVariant(item.indexType))
+        index = combo.findData(item.indexType)
         combo.setCurrentIndex(index)
         data = self.indexCombo.itemData(index)
         if data.isValid():
@@ -532,22 +682,35 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         self.model = QStandardItemModel(self)
         self.treeView.setModel(self.model)
         self.treeView.header().hide()
+        self.treeView.setUniformRowHeights(True)
+        self.treeView.setAnimated(False)
+        self.indexName.oldText = ''
+        self.itemIcons = {
+            RunnerItem:self.actionInsertRunner.icon(),
+            CallableItem:self.actionInsertCallable.icon(),
+            FieldItem:self.actionInsertField.icon(),
+            IndexItem:self.actionInsertIndex.icon(),
+        }
         self.initialTitle = self.windowTitle()
         self.connect(self, Signals.modified, self.checkModified)
         for toolbar in self.findChildren(QToolBar):
             self.menuToolbars.addAction(toolbar.toggleViewAction())
-        self.indexCombo.addItem('<none>', QVariant())
-        for name in sorted(indexTypes()):
-            self.indexCombo.addItem(name, QVariant(name))
-        self.fieldCombo.addItem('<none>', QVariant())
-        for id, name in sorted(fieldTypes().items()):
-            self.fieldCombo.addItem(name, QVariant(id))
-        self.runnerMessageHandler.setProperty(
-            'execType', QVariant('message'))
-        self.runnerSingleShot.setProperty(
-            'execType', QVariant('single'))
-        self.runnerThread.setProperty(
-            'execType', QVariant('thread'))
+        ## the combo handlers have nothing to do while the combos are
+        ## filled, so keep the first addItem from signalling them.
+        indexCombo, fieldCombo = self.indexCombo, self.fieldCombo
+        indexCombo.blockSignals(True)
+        fieldCombo.blockSignals(True)
+        indexCombo.addItem('<none>')
+        for name in self.indexTypeNames:
+            indexCombo.addItem(name, name)
+        fieldCombo.addItem('<none>')
+        for id, name in self.fieldTypeItems:
+            fieldCombo.addItem(name, id)
+        indexCombo.blockSignals(False)
+        fieldCombo.blockSignals(False)
+        self.runnerMessageHandler.setProperty('execType', 'message')
+        self.runnerSingleShot.setProperty('execType', 'single')
+        self.runnerThread.setProperty('execType', 'thread')
 
     def showMessage(self, text, duration=3000):
         """ Displays text in the window status bar.
@@ -558,43 +721,47 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         """
         self.statusBar().showMessage(text, duration)
 
+    @modifiedDeferred
     def readStrategy(self, schema, filename):
-        """ Creates tree items from given schema.
+        """ Creates tree items from given schema and adds them to the model.
 
-        @param schema ticker schema as dictionary
-        @return None
+        @param schema iterable of strategy item dictionaries
+        @param filename name of the file holding the schema
+        @return True if the items were read, otherwise False
         """
         try:
-            for data in schema:
-                self.addStrategyItem(data)
-        except (Exception, ), ex:
-            print '##', ex
+            items = self.createStrategyItems(schema)
+        except readErrors, exc:
+            logging.warn('Unable to read schema: %s', exc)
+            items = None
+        if items is None:
             QMessageBox.warning(self, 'Warning', 'Unable to read schema.')
             self.resetStrategy()
-        else:
-            self.savedStrategy = schema
+            return False
+        tree = self.treeView
+        tree.setUpdatesEnabled(False)
+        try:
+            if items:
+                self.model.invisibleRootItem().appendRows(items)
+            self.schemaCache = None
             self.strategyFile = filename
             self.resetWindowTitle()
-            self.treeView.expandAll()
-            root = self.model.invisibleRootItem()
-            items = [root.child(row) for row in range(root.rowCount())]
-            for item in items:
-                for c in item.children(True):
-                    self.resetIcon(c)
-
-    def resetIcon(self, item):
-        icons = {
-            FieldItem:self.actionInsertField,
-            IndexItem:self.actionInsertIndex,
-            CallableItem:self.actionInsertCallable,
-        }
-        typ = type(item)
-        try:
-            action = icons[typ]
-        except (KeyError, ):
-            pass
-        else:
-            item.setIcon(action.icon())
+            tree.expandAll()
+        finally:
+            tree.setUpdatesEnabled(True)
+        return True
+
+    @collectionSuspended
+    def writeStrategy(self, handle):
+        """ Writes the strategy schema from the tree to an open file.
+
+        @param handle file object opened for binary writing
+        @return None
+        """
+        root = self.model.invisibleRootItem()
+        count = root.rowCount()
+        items = (root.child(row).toSchema() for row in range(count))
+        dumpStrategy(items, handle, count)
 
     def writeSettings(self):
         """ Saves window settings and state.
@@ -619,117 +786,119 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         current = str(widget.text())
         include = [self.defaultText, '']
         if current in include or current.startswith('%s-' % previous):
-            flags = Qt.MatchStartsWith | Qt.MatchRecursive
-            matches = self.model.findItems(item.indexType, flags)
+            prefix = '%s-' % item.indexType
             suffix = 1
-            for match in matches:
-                if item.root() == match.root():
+            for match in item.root().children(True):
+                name = str(match.text())
+                if name.startswith(prefix):
                     try:
-                        name = str(match.text())
-                        offset = int(name.split('-')[1])
-                    except (ValueError, IndexError, ), ex:
+                        offset = int(name[len(prefix):])
+                    except (ValueError, ):
                         pass
                     else:
                         suffix = max(suffix, offset+1)
             widget.setText('%s-%s' % (item.indexType, suffix))
-            self.emit(Signals.modified)
+            self.emitModified()
 
     # widget signal handlers
 
-    def on_currencyEdit_textEdited(self, text):
+    @pyqtSignature('QString')
+    @requiresEditItem
+    def on_currencyEdit_textEdited(self, item, text):
         """ Signal handler for ticker currency line edit widget text changes.
 
         @param text new value for line edit
         @return None
         """
-        item = self.editItem
-        if item:
-            item.currency = str(text)
-            self.emit(Signals.modified)
+        item.currency = str(text)
+        self.emitModified()
 
-    def on_exchangeEdit_textEdited(self, text):
+    @pyqtSignature('QString')
+    @requiresEditItem
+    def on_exchangeEdit_textEdited(self, item, text):
         """ Signal handler for exchange line edit widget text changes.
 
         @param text new value for line edit
         @return None
         """
-        if self.editItem:
-            self.editItem.exchange = str(text)
-            self.emit(Signals.modified)
+        item.exchange = str(text)
+        self.emitModified()
 
-    def on_expiryEdit_textEdited(self, text):
+    @pyqtSignature('QString')
+    @requiresEditItem
+    def on_expiryEdit_textEdited(self, item, text):
         """ Signal handler for ticker expiry line edit widget text changes.
 
         @param text new value for line edit
         @return None
         """
-        item = self.editItem
-        if item:
-            item.expiry = str(text)
-            self.emit(Signals.modified)
+        item.expiry = str(text)
+        self.emitModified()
 
     @pyqtSignature('int')
-    def on_fieldCombo_currentIndexChanged(self, index):
+    @modifiedDeferred
+    @requiresEditItem
+    def on_fieldCombo_currentIndexChanged(self, item, index):
         """ Signal handler for field type combobox selection changes.
 
         @param index selected item index
         @return None
         """
-        item = self.editItem
-        if item:
-            data = self.fieldCombo.itemData(index)
-            if data.isValid():
-                fid = data.toInt()[0]
-                if fid in [other.id for other in item.siblings()]:
-                    self.showMessage('Duplicate ticker fields not allowed.')
-                    self.fieldCombo.setCurrentIndex(0)
-                    return
-                old = item.text()
-                try:
-                    new = fieldTypes()[fid]
-                    item.setText(new)
-                except (KeyError, ):
-                    pass
-                else:
-                    item.id = fid
-                    if not self.updateLines(item, old, new):
-                        self.emit(Signals.modified)
+        data = self.fieldCombo.itemData(index)
+        if data.isValid():
+            fid = data.toInt()[0]
+            if any(other.id == fid for other in item.siblings()):
+                self.showMessage('Duplicate ticker fields not allowed.')
+                self.fieldCombo.setCurrentIndex(0)
+                return
+            old = item.text()
+            try:
+                new = fieldTypes()[fid]
+                item.setText(new)
+            except (KeyError, ):
+                pass
             else:
-                self.emit(Signals.modified)
+                item.id = fid
+                if not self.updateLines(item, old, new):
+                    self.emitModified()
+        else:
+            self.emitModified()
 
     @pyqtSignature('')
-    def on_iconSelect_clicked(self):
+    @requiresEditItem
+    def on_iconSelect_clicked(self, item):
         """ Signal handler for select icon button.
 
         @return None
         """
-        item = self.editItem
-        if item:
-            formats = str.join(' ', ['*.%s' % str(fmt) for fmt in
-                                     QImageReader.supportedImageFormats()])
-            filename = QFileDialog.getOpenFileName(
-                self, 'Select Symbol Icon', '', 'Images (%s)' % formats)
-            if filename:
-                icon = QIcon(filename)
-                item.setIcon(icon)
-                self.iconPreview.setPixmap(icon.pixmap(32,32))
-                settings = self.settings
-                settings.setValue('%s/icon' % item.symbol, icon)
-                self.emit(Signals.modified)
+        if self.imageFilter is None:
+            formats = ' '.join('*.%s' % str(fmt) for fmt in
+                               QImageReader.supportedImageFormats())
+            self.imageFilter = 'Images (%s)' % formats
+        filename = QFileDialog.getOpenFileName(
+            self, 'Select Symbol Icon', '', self.imageFilter)
+        if filename:
+            icon = QIcon(filename)
+            item.setIcon(icon)
+            self.iconPreview.setPixmap(icon.pixmap(32,32))
+            settings = self.settings
+            settings.setValue('%s/icon' % item.symbol, icon)
+            self.emitModified()
 
     @pyqtSignature('int')
-    def on_idSpin_valueChanged(self, value):
+    @requiresEditItem
+    def on_idSpin_valueChanged(self, item, value):
         """ Signal handler for ticker id spin box changes.
 
         @param value new value of spinbox
         @return None
         """
-        item = self.editItem
-        if item:
-            item.tickerId = value
-            self.emit(Signals.modified)
+        item.tickerId = value
+        self.nextTickerId = max(self.nextTickerId, value + 1)
+        self.emitModified()
 
     @pyqtSignature('int')
+    @modifiedDeferred
     def on_indexCombo_currentIndexChanged(self, index):
         """ Signal handler for index type combobox selection changes.
 
@@ -752,75 +921,71 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
                     self.setupIndexItemParamWidgets(cls, item)
                     self.setupIndexItemDocWidgets(cls)
                     self.maybeChangeIndexName(item, old)
-                    self.emit(Signals.modified)
+                    self.emitModified()
 
+    @pyqtSignature('QString')
     def on_indexName_textChanged(self, text):
         """ Signal handler for index name line edit widget changes.
 
         @param text new value for line edit
         @return None
         """
-        try:
-            old = self.indexName.oldText
-        except (AttributeError, ):
-            old = self.indexName.oldText = ''
-        renamed = self.updateLines(self.editItem, old, text)
-        self.indexName.oldText = str(text)
+        text = str(text)
+        renamed = self.updateLines(self.editItem, self.indexName.oldText, text)
+        self.indexName.oldText = text
         if self.editItem:
             self.editItem.setText(text)
             if not renamed:
-                self.emit(Signals.modified)
+                self.emitModified()
 
     @pyqtSignature('int')
-    def on_rightCombo_currentIndexChanged(self, index):
+    @requiresEditItem
+    def on_rightCombo_currentIndexChanged(self, item, index):
         """ Signal handler for security right combobox selection changes.
 
         @param index selected item index
         @return None
         """
-        item = self.editItem
-        if item:
-            item.right = str(self.rightCombo.currentText())
-            self.emit(Signals.modified)
+        item.right = str(self.rightCombo.currentText())
+        self.emitModified()
 
     @pyqtSignature('int')
-    def on_secTypeCombo_currentIndexChanged(self, index):
+    @requiresEditItem
+    def on_secTypeCombo_currentIndexChanged(self, item, index):
         """ Signal handler for security type combobox selection changes.
 
         @param index selected item index
         @return None
         """
-        item = self.editItem
-        if item:
-            item.secType = str(self.secTypeCombo.currentText())
-            self.emit(Signals.modified)
+        item.secType = str(self.secTypeCombo.currentText())
+        self.emitModified()
 
     @pyqtSignature('double')
-    def on_strikeSpin_valueChanged(self, value):
+    @requiresEditItem
+    def on_strikeSpin_valueChanged(self, item, value):
         """ Signal handler for ticker strike price spin box changes.
 
         @param value new value of spinbox
         @return None
         """
-        item = self.editItem
-        if item:
-            item.strike = value
-            self.emit(Signals.modified)
+        item.strike = value
+        self.emitModified()
 
-    def on_symbolEdit_textEdited(self, text):
+    @pyqtSignature('QString')
+    @requiresEditItem
+    def on_symbolEdit_textEdited(self, item, text):
         """ Signal handler for symbol name line edit widget changes.
 
         @param text new value for line edit
         @return None
         """
-        item = self.editItem
-        if item:
-            item.symbol = str(text)
-            item.setText(text)
-            item.loadIcon(self.settings)
-            self.iconPreview.setPixmap(item.icon().pixmap(32, 32))
-            self.emit(Signals.modified)
+        item.symbol = str(text)
+        item.setText(text)
+        item.loadIcon(self.settings)
+        self.iconPreview.setPixmap(item.icon().pixmap(32, 32))
+        self.emitModified()
 
+    @pyqtSignature('QModelIndex')
     def on_treeView_clicked(self, index):
         """ Signal handler for schema tree mouse click.
 
@@ -830,17 +995,16 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         self.enableActions(index)
         item = self.model.itemFromIndex(index)
         itemtype = type(item)
-        try:
-            pageindex = self.itemTypePages[itemtype]
-        except (KeyError, ):
-            pass
-        else:
+        pageindex = self.itemTypePages.get(itemtype)
+        if pageindex is not None:
             self.controlStack.setCurrentIndex(pageindex)
-            setup = getattr(self, 'setup%s' % itemtype.__name__, None)
+            setup = self.itemTypeSetups.get(itemtype)
             if setup:
+                ## setup methods may fill in missing item values
+                self.schemaCache = None
                 try:
                     self.editItem = None
-                    setup(item)
+                    setup(self, item)
                 finally:
                     self.editItem = item
 
@@ -869,48 +1033,46 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         self.clipItem.setCopy()
 
     @pyqtSignature('')
-    def on_actionCut_triggered(self):
+    @requiresEditItem
+    def on_actionCut_triggered(self, item):
         """ Signal handler for cut action.
 
         @return None
         """
-        if self.editItem:
-            if self.clipItem:
-                self.clipItem.resetForeground()
-            self.clipItem = self.editItem
-            self.clipItem.setCut()
+        if self.clipItem:
+            self.clipItem.resetForeground()
+        self.clipItem = item
+        item.setCut()
 
     @pyqtSignature('')
-    def on_actionDelete_triggered(self):
+    @requiresEditItem
+    def on_actionDelete_triggered(self, item):
         """ Signal handler for item delete action; removes item from tree.
 
         @return None
         """
-        item = self.editItem
-        if item:
-            if item is self.clipItem:
-                self.clipItem = None
-            self.editItem = None
-            index = self.model.indexFromItem(item)
-            self.model.removeRow(index.row(), index.parent())
-            self.enableActions(None)
-            self.treeView.selectionModel().clear()
-            self.controlStack.setCurrentIndex(0)
-            self.emit(Signals.modified)
+        if item is self.clipItem:
+            self.clipItem = None
+        self.editItem = None
+        self.treeView.selectionModel().clear()
+        index = self.model.indexFromItem(item)
+        self.model.removeRow(index.row(), index.parent())
+        self.enableActions(None)
+        self.controlStack.setCurrentIndex(0)
+        self.emitModified()
 
     @pyqtSignature('')
     def on_actionInsertRunner_triggered(self):
         self.addRunnerItem({})
-        self.emit(Signals.modified)
+        self.emitModified()
 
     @pyqtSignature('')
-    def on_actionInsertCallable_triggered(self):
-        if self.editItem:
-            item = CallableItem.fromSchema()
-            item.setIcon(self.actionInsertCallable.icon())
-            self.editItem.appendRow(item)
-            self.treeView.expand(item.parent().index())
-            self.emit(Signals.modified)
+    @requiresEditItem
+    def on_actionInsertCallable_triggered(self, parent):
+        item = CallableItem.fromSchema(icons=self.itemIcons)
+        parent.appendRow(item)
+        self.treeView.expand(parent.index())
+        self.emitModified()
 
     @pyqtSignature('')
     def on_actionInsertTicker_triggered(self):
@@ -918,58 +1080,49 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
 
         @return None
         """
-        tickerId = 1
-        root = self.model.invisibleRootItem()
-        items = [root.child(r, 0) for r in range(root.rowCount())]
-        if items:
-            tickerId += max([getattr(i, 'tickerId', 0) for i in items])
-        self.addTickerItem(dict(tickerId=tickerId, symbol=''))
-        self.emit(Signals.modified)
+        self.addTickerItem(dict(tickerId=self.nextTickerId, symbol=''))
+        self.emitModified()
 
     @pyqtSignature('')
-    def on_actionInsertField_triggered(self):
+    @requiresEditItem
+    def on_actionInsertField_triggered(self, parent):
         """ Signal handler for insert field action; adds field item to tree.
 
         @return None
         """
-        if self.editItem:
-            item = FieldItem.fromSchema()
-            item.setIcon(self.actionInsertField.icon())
-            self.editItem.appendRow(item)
-            self.treeView.expand(item.parent().index())
-            self.emit(Signals.modified)
+        item = FieldItem.fromSchema(icons=self.itemIcons)
+        parent.appendRow(item)
+        self.treeView.expand(parent.index())
+        self.emitModified()
 
     @pyqtSignature('')
-    def on_actionInsertIndex_triggered(self):
+    @requiresEditItem
+    def on_actionInsertIndex_triggered(self, parent):
         """ Signal handler for insert index action; adds index item to tree.
 
         """
-        if self.editItem:
-            item = IndexItem.fromSchema()
-            item.setIcon(self.actionInsertIndex.icon())
-            self.editItem.appendRow(item)
-            self.treeView.expand(item.parent().index())
-            self.emit(Signals.modified)
+        item = IndexItem.fromSchema(icons=self.itemIcons)
+        parent.appendRow(item)
+        self.treeView.expand(parent.index())
+        self.emitModified()
 
     @pyqtSignature('')
-    def on_actionMoveDown_triggered(self):
+    @requiresEditItem
+    def on_actionMoveDown_triggered(self, item):
         """ Signal handler for item move down action; moves item down tree.
 
         @return None
         """
-        item = self.editItem
-        if item:
-            self.moveItem(item, 1)
+        self.moveItem(item, 1)
 
     @pyqtSignature('')
-    def on_actionMoveUp_triggered(self):
+    @requiresEditItem
+    def on_actionMoveUp_triggered(self, item):
         """ Signal handler for item move up action; moves item up tree.
 
         @return None
         """
-        item = self.editItem
-        if item:
-            self.moveItem(item, -1)
+        self.moveItem(item, -1)
 
     @pyqtSignature('')
     def on_actionNewStrategy_triggered(self):
@@ -992,21 +1145,21 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
             if filename:
                 filename = str(filename)
                 try:
-                    handle = open(filename, 'rb')
-                except (Exception, ):
+                    key = (filename, getmtime(filename))
+                    if key == self.strategyKey and not self.isWindowModified():
+                        ## the tree already holds this file, unchanged
+                        return
+                    handle = open(filename, 'rb', fileBufferSize)
+                except (IOError, OSError, ):
                     QMessageBox.warning(
                         self, 'Error', 'IO error reading schema file. ' + filename)
-                else:
-                    try:
-                        schema = load(handle)
-                    except (Exception, ):
-                        QMessageBox.warning(
-                            self, 'Error', 'Unable to read schema file.')
-                    else:
-                        self.resetStrategy()
-                        self.readStrategy(schema, filename)
-                    finally:
-                        handle.close()
+                    return
+                try:
+                    self.resetStrategy()
+                    if self.readStrategy(iterStrategy(handle), filename):
+                        self.strategyKey = key
+                finally:
+                    handle.close()
 
     @pyqtSignature('')
     def on_actionPaste_triggered(self):
@@ -1019,6 +1172,8 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
         sourceitem = self.clipItem
         targetitem = self.editItem
         model = self.model
+        selectmodel = self.treeView.selectionModel()
+        selectmodel.clear()
         sourcerow = model.indexFromItem(sourceitem).row()
         sourceparent = sourceitem.parent()
         if sourceitem.cutSource:
@@ -1026,18 +1181,17 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
             newchild = sourceitem
         else:
             newchild = sourceitem.clone()
-            self.resetIcon(newchild)
-            for c in newchild.children():
-                self.resetIcon(c)
         targetitem.setChild(targetitem.rowCount(), newchild)
         if sourceitem.cutSource:
             newchild.resetForeground()
             model.removeRow(sourcerow, sourceparent.index())
             self.clipItem = None
-        self.treeView.expand(model.indexFromItem(targetitem))
+        targetindex = model.indexFromItem(targetitem)
+        self.treeView.expand(targetindex)
         self.treeView.expand(model.indexFromItem(newchild))
-        self.enableActions(model.indexFromItem(targetitem))
-        self.emit(Signals.modified)
+        selectmodel.select(targetindex, selectmodel.Select)
+        self.enableActions(targetindex)
+        self.emitModified()
 
     @pyqtSignature('')
     def on_actionSaveStrategy_triggered(self):
@@ -1049,14 +1203,15 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
             self.actionSaveStrategyAs.trigger()
         else:
             try:
-                handle = open(self.strategyFile, 'wb')
-            except (Exception, ):
+                handle = open(self.strategyFile, 'wb', fileBufferSize)
+            except (IOError, OSError, ):
                 QMessageBox.warning(
                     self, 'Error', 'IO error opening file for writing.')
             else:
+                self.strategyKey = None
                 try:
-                    dump(self.schema(), handle)
-                except (Exception, ):
+                    self.writeStrategy(handle)
+                except writeErrors:
                     QMessageBox.warning(
                         self, 'Error', 'Unable to save schema file.')
                 else:
@@ -1087,11 +1242,10 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
     on_callableName_textEdited = itemEditedNameMatchMethod()
 
     @pyqtSignature('int')
-    def on_runnerPeriodInterval_valueChanged(self, value):
-        item = self.editItem
-        if item:
-            item.periodInterval = value
-            self.emit(Signals.modified)
+    @requiresEditItem
+    def on_runnerPeriodInterval_valueChanged(self, item, value):
+        item.periodInterval = value
+        self.emitModified()
 
     def on_runnerMessageTypes_itemChanged(self, listItem):
         checked = listItem.checkState()==Qt.Checked
@@ -1102,39 +1256,45 @@ class StrategyDesigner(QMainWindow, Ui_StrategyDesigner):
                 editItem.messageTypes.add(key)
             else:
                 editItem.messageTypes.discard(key)
-            self.emit(Signals.modified)
+            self.emitModified()
 
     def __on_textEdit_textChanged(self):
         item = self.editItem
         if item:
             item.moduleSource = self.callableEditor.sourceText
 
-    def on_callableLocation_textChanged(self, text):
-        item = self.editItem
-        if item:
-            item.callLocation = self.callableEditor.locationText
+    @pyqtSignature('QString')
+    @requiresEditItem
+    def on_callableLocation_textChanged(self, item, text):
+        item.callLocation = self.callableEditor.locationText
+        self.schemaCache = None
 
     @pyqtSignature('QString')
-    def on_callableType_currentIndexChanged(self, text):
-        item = self.editItem
-        if item:
-            calltype = self.callableEditor.callableType.itemData(
-                self.callableEditor.callableType.currentIndex()).toString()
-            item.callType = str(calltype)
+    @requiresEditItem
+    def on_callableType_currentIndexChanged(self, item, text):
+        calltype = self.callableEditor.callableType.itemData(
+            self.callableEditor.callableType.currentIndex()).toString()
+        item.callType = str(calltype)
+        self.schemaCache = None
 
     @pyqtSignature('')
-    def on_callableLocationSelect_clicked(self):
-        item = self.editItem
-        if item:
-            current = item.callLocation
-            if current != self.callableEditor.locationText:
-                item.callLocation = self.callableEditor.locationText
+    @requiresEditItem
+    def on_callableLocationSelect_clicked(self, item):
+        current = item.callLocation
+        if current != self.callableEditor.locationText:
+            item.callLocation = self.callableEditor.locationText
+            self.schemaCache = None
 
     @pyqtSignature('')
     def on_actionPrintStrategy_triggered(self):
         import pprint
         pprint.pprint(self.schema())
 
+    itemTypeSetups = {
+        TickerItem:setupTickerItem, FieldItem:setupFieldItem,
+        IndexItem:setupIndexItem, CallableItem:setupCallableItem,
+        RunnerItem:setupRunnerItem}
+
 
 if __name__ == '__main__':
     import sys
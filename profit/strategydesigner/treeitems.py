@@ -12,6 +12,22 @@ from profit.strategy import schema
 
 
 defaultName = 'Unknown'
+defaultIconPath = ':images/icons/mime_empty.png'
+iconCache = {}
+
+
+def resourceIcon(path):
+    """ Returns a shared icon for the image at path, null if not found.
+
+    @param path image file or resource path
+    @return QIcon instance
+    """
+    try:
+        return iconCache[path]
+    except (KeyError, ):
+        icon = iconCache[path] = (QIcon() if QPixmap(path).isNull()
+                                  else QIcon(path))
+        return icon
 
 
 class SchemaItem(QStandardItem):
@@ -29,24 +45,59 @@ class SchemaItem(QStandardItem):
         self.copySource = False
 
     def canPaste(self, typeobj):
-        try:
-            return self.allowChildType(typeobj.__bases__[1])
-        except (AttributeError, IndexError, ):
-            return False
+        bases = getattr(typeobj, '__bases__', ())
+        return len(bases) > 1 and self.allowChildType(bases[1])
 
     def children(self, descend=False):
         """ Yields each immediate child of this item, optionally all children
 
         """
-        for r in range(self.rowCount()):
-            child = self.child(r, 0)
-            yield child
-            if descend:
-                for c in child.children(True):
-                    yield c
+        child = self.child
+        if not descend:
+            for r in range(self.rowCount()):
+                yield child(r, 0)
+            return
+        stack = [child(r, 0) for r in range(self.rowCount()-1, -1, -1)]
+        pop, extend = stack.pop, stack.extend
+        while stack:
+            item = pop()
+            yield item
+            child = item.child
+            extend([child(r, 0) for r in range(item.rowCount()-1, -1, -1)])
 
     def clone(self):
-        return self.fromSchema(self.toSchema())
+        """ Returns a copy of this item and all of its children.
+
+        @return new tree item instance
+        """
+        clone = self.copyItem()
+        stack = [(self, clone)]
+        while stack:
+            source, target = stack.pop()
+            for child in source.children():
+                copy = child.copyItem()
+                target.appendRow(copy)
+                stack.append((child, copy))
+        return clone
+
+    def copyItem(self):
+        """ Returns a copy of this item and its icon, without its children.
+
+        Container attribute values are copied so the new item doesn't
+        share them with this one.
+
+        @return new tree item instance
+        """
+        item = self.__class__(self.text())
+        item.setIcon(self.icon())
+        for attr, default in self.attrs.items():
+            value = getattr(self, attr, default)
+            if isinstance(value, list):
+                value = value[:]
+            elif isinstance(value, (dict, set)):
+                value = value.copy()
+            setattr(item, attr, value)
+        return item
 
     def resetForeground(self):
         """ Sets the foreground brush for this item to the original.
@@ -83,10 +134,11 @@ class SchemaItem(QStandardItem):
 
         """
         parent = self.parent()
+        child = parent.child
         for row in range(parent.rowCount()):
-            child = parent.child(row, 0)
-            if child is not self:
-                yield child
+            item = child(row, 0)
+            if item is not self:
+                yield item
 
     def root(self):
         """ Returns the top-most parent of this item.
@@ -101,34 +153,56 @@ class SchemaItem(QStandardItem):
         return item
 
     @classmethod
-    def fromSchema(cls, data={}):
+    def fromSchema(cls, data={}, icons={}):
         """ Creates a tree item given a schema.
 
         @param data schema dictionary
+        @param icons mapping of item types to icons for new items
         @return tree item instance
         """
         instance = cls(data.get('name', defaultName))
+        icon = icons.get(cls)
+        if icon is not None:
+            instance.setIcon(icon)
         for attr, default in cls.attrs.items():
-            if isinstance(default, (tuple, list)):
-                default = default[:]
-            elif isinstance(default, (dict, set)):
-                default = default.copy()
-            setattr(instance, attr, data.get(attr, default))
+            value = data.get(attr, default)
+            if isinstance(default, set):
+                value = set(value)
+            elif isinstance(value, list):
+                value = value[:]
+            elif isinstance(value, dict):
+                value = value.copy()
+            setattr(instance, attr, value)
         for child in data.get('children', []):
-            instance.appendRow(cls.childType(data).fromSchema(child))
+            instance.appendRow(cls.childType(data).fromSchema(child, icons))
         return instance
 
     def toSchema(self):
         """ Generated schema dictionary for this item.
 
+        The tree is walked once with an explicit stack; each item's
+        mapping is appended to its parent's children list as the item
+        is visited, so sibling order is kept.
+
         @return schema as a dictionary
         """
-        mapping = dict([(attr, getattr(self, attr, default))
-                        for attr, default in self.attrs.items()])
-        mapping['children'] = [c.toSchema() for c in self.children()]
-        mapping['name'] = str(self.text())
-        mapping['type'] = str(self.__class__.__name__)
-        return mapping
+        schema = None
+        stack = [(self, None)]
+        while stack:
+            item, siblings = stack.pop()
+            children = []
+            mapping = {'children': children,
+                       'name': str(item.text()),
+                       'type': item.__class__.__name__}
+            for attr, default in item.attrs.iteritems():
+                mapping[attr] = getattr(item, attr, default)
+            if siblings is None:
+                schema = mapping
+            else:
+                siblings.append(mapping)
+            for r in range(item.rowCount()-1, -1, -1):
+                stack.append((item.child(r, 0), children))
+        return schema
 
 
 class RunnerItem(SchemaItem, schema.Runner):
@@ -154,16 +228,14 @@ class TickerItem(SchemaItem, schema.Ticker):
         @param settings QSettings instance
         @return None
         """
-        name = self.symbol.lower()
+        name = (self.symbol or '').lower()
         icon = settings.value('%s/icon' % name)
         if icon.isValid():
             icon = QIcon(icon)
         else:
-            path = ':images/tickers/%s.png' % name
-            if QPixmap(path).isNull():
-                icon = QIcon(':images/icons/mime_empty.png')
-            else:
-                icon = QIcon(path)
+            icon = resourceIcon(':images/tickers/%s.png' % name)
+            if icon.isNull():
+                icon = resourceIcon(defaultIconPath)
         self.setIcon(icon)
 
 